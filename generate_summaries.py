@@ -3,12 +3,18 @@
 Generate individual summaries for each node in the Buddhist text outline using Gemini Flash 2.5 API.
 """
 
-import json
+import asyncio
+import logging
+import logging.handlers
 import os
+import queue
 import sys
-import google.generativeai as genai
-from typing import Dict, Any, List
 import time
+import google.generativeai as genai
+import orjson
+from google.api_core import exceptions as google_exceptions
+from typing import Dict, Any, List, Optional
+from level_ids import generate_level_id
 
 # =====================================================
 # CONFIGURATION - Update these paths as needed
@@ -16,8 +22,36 @@ import time
 OUTLINE_PATH = "data/chojuk/chapter_1/chapter_1_outline.json"
 COMMENTARY_PATH = "data/chojuk/chapter_1/chapter_1_commentary.txt"
 SUMMARIES_DIR = "summaries"
+MAX_CONCURRENT_REQUESTS = 8  # Size this to your Gemini requests-per-minute quota
+REQUESTS_PER_MINUTE = 60
+MAX_RETRIES = 5  # Retries per node after a 429 (rate limit) response
+RETRY_BASE_DELAY = 2.0  # Seconds; doubled on each retry unless the server suggests a delay
 # =====================================================
 
+logger = logging.getLogger(__name__)
+
+class RateLimiter:
+    """Token bucket that spaces API calls to stay within a requests-per-minute quota."""
+    
+    def __init__(self, requests_per_minute: int, burst: int = 1):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.last_refill = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """Wait until a token is available and consume it."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
 # Configure the Gemini API
 def configure_gemini():
     """Configure Gemini API with API key from environment variable."""
@@ -33,8 +67,8 @@ def configure_gemini():
 def load_files(outline_path: str, commentary_path: str) -> tuple:
     """Load the outline and commentary files."""
     try:
-        with open(outline_path, 'r', encoding='utf-8') as f:
-            outline = json.load(f)
+        with open(outline_path, 'rb') as f:
+            outline = orjson.loads(f.read())
         
         with open(commentary_path, 'r', encoding='utf-8') as f:
             commentary = f.read()
@@ -46,15 +80,20 @@ def load_files(outline_path: str, commentary_path: str) -> tuple:
         print(f"  OUTLINE_PATH = '{outline_path}'")
         print(f"  COMMENTARY_PATH = '{commentary_path}'")
         sys.exit(1)
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         print(f"Error: Invalid JSON in outline file: {e}")
         sys.exit(1)
 
-def create_summary_prompt(outline: List[Dict], current_node: Dict, commentary: str) -> str:
-    """Create a detailed prompt for Gemini to generate the summary in Tibetan."""
+def create_summary_prompt(outline_json: str, current_node: Dict, commentary: str) -> str:
+    """Create a detailed prompt for Gemini to generate the summary in Tibetan.
+    
+    outline_json is the full outline already serialized to JSON, so it is built
+    once per run rather than once per node.
+    """
     
     # Remove verse_text_excerpt from current_node for processing
-    node_for_prompt = {k: v for k, v in current_node.items() if k != 'verse_text_excerpt'}
+    node_for_prompt = dict(current_node)
+    node_for_prompt.pop('verse_text_excerpt', None)
     
     prompt = f"""
 You are an expert in Buddhist philosophy and Tibetan language. I need you to generate a comprehensive summary for a specific node in a hierarchical outline of a Buddhist root text.
@@ -66,10 +105,10 @@ CONTEXT:
 - Verses span: {current_node.get('verses_span', 'Unknown')}
 
 FULL HIERARCHICAL OUTLINE:
-{json.dumps(outline, indent=2, ensure_ascii=False)}
+{outline_json}
 
 CURRENT NODE TO ANALYZE:
-{json.dumps(node_for_prompt, indent=2, ensure_ascii=False)}
+{orjson.dumps(node_for_prompt, option=orjson.OPT_INDENT_2).decode()}
 
 FULL COMMENTARY TEXT:
 {commentary}
@@ -109,87 +148,126 @@ IMPORTANT REQUIREMENTS:
     
     return prompt
 
-def generate_summary(model, outline: List[Dict], current_node: Dict, commentary: str) -> Dict:
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Return the server-suggested retry delay in seconds, if the error carries one."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    retry_after = headers.get('Retry-After')
+    try:
+        return float(retry_after) if retry_after is not None else None
+    except ValueError:
+        return None
+
+async def request_with_retry(model, prompt: str, limiter: RateLimiter):
+    """Send a prompt to Gemini, backing off exponentially on rate-limit errors."""
+    for attempt in range(MAX_RETRIES + 1):
+        await limiter.acquire()
+        try:
+            return await model.generate_content_async(prompt)
+        except google_exceptions.ResourceExhausted as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = get_retry_after(e) or RETRY_BASE_DELAY * 2 ** attempt
+            logger.warning(f"Rate limited by Gemini, retrying in {delay:.1f}s...")
+            await asyncio.sleep(delay)
+
+async def generate_summary(model, outline_json: str, current_node: Dict, commentary: str,
+                           limiter: RateLimiter) -> Dict:
     """Generate a summary for a single node using Gemini API."""
     
-    prompt = create_summary_prompt(outline, current_node, commentary)
+    prompt = create_summary_prompt(outline_json, current_node, commentary)
     
     try:
-        response = model.generate_content(prompt)
-        
-        # Clean the response text to extract JSON
-        response_text = response.text.strip()
+        response = await request_with_retry(model, prompt, limiter)
         
-        # Remove any markdown formatting if present
-        if response_text.startswith('```json'):
-            response_text = response_text[7:]
-        if response_text.endswith('```'):
-            response_text = response_text[:-3]
-        
-        response_text = response_text.strip()
+        # Clean the response text to extract JSON, removing any markdown fences
+        response_text = (response.text.strip()
+                         .removeprefix('```json')
+                         .removeprefix('```')
+                         .removesuffix('```')
+                         .strip())
         
         # Parse the JSON response
-        summary_data = json.loads(response_text)
+        summary_data = orjson.loads(response_text)
         
         return summary_data
         
-    except json.JSONDecodeError as e:
-        print(f"Error: Invalid JSON response from Gemini for node {current_node.get('number', 'unknown')}: {e}")
-        print(f"Raw response: {response.text}")
+    except orjson.JSONDecodeError as e:
+        logger.error(f"Error: Invalid JSON response from Gemini for node {current_node.get('number', 'unknown')}: {e}")
+        logger.error(f"Raw response: {response.text}")
         return None
     except Exception as e:
-        print(f"Error generating summary for node {current_node.get('number', 'unknown')}: {e}")
+        logger.error(f"Error generating summary for node {current_node.get('number', 'unknown')}: {e}")
         return None
 
-def traverse_and_generate(model, outline: List[Dict], commentary: str, summaries_dir: str):
-    """Traverse the outline tree and generate summaries for each node."""
+def collect_pending_nodes(outline: List[Dict], summaries_dir: str) -> List[tuple]:
+    """Walk the outline depth-first and return (level_id, node) pairs still lacking a summary."""
+    # List the directory once instead of stat-ing a path per node
+    with os.scandir(summaries_dir) as entries:
+        existing = {entry.name for entry in entries}
+    
+    pending = []
+    stack = list(reversed(outline))
     
-    def process_node(node: Dict):
-        """Process a single node and its children."""
+    while stack:
+        node = stack.pop()
+        level_id = generate_level_id(node)
         
-        # Generate level identifier for filename
-        level_id = node.get('number', '').replace('.', '-')
-        if node.get('level') == 'chapter':
-            level_id = f"chapter-{level_id}"
-        elif node.get('level') == 'section':
-            level_id = f"section-{level_id}"
-        elif node.get('level') == 'subsection':
-            level_id = f"subsection-{level_id}"
-        elif node.get('level') == 'sub-subsection':
-            level_id = f"sub-subsection-{level_id}"
-        elif node.get('level') == 'sub-sub-subsection':
-            level_id = f"sub-sub-subsection-{level_id}"
-        elif node.get('level') == 'sub-sub-sub-subsection':
-            level_id = f"sub-sub-sub-subsection-{level_id}"
+        # Skip if file already exists (for resumability)
+        if f"{level_id}.json" in existing:
+            logger.info(f"Skipping {level_id} - summary already exists")
+        else:
+            pending.append((level_id, node))
         
+        # Push children in reverse so they are visited in document order
+        stack.extend(reversed(node.get('children', [])))
+    
+    return pending
+
+async def traverse_and_generate(model, outline: List[Dict], commentary: str, summaries_dir: str,
+                                max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+                                requests_per_minute: int = REQUESTS_PER_MINUTE):
+    """Traverse the outline tree and generate summaries for each node concurrently."""
+    
+    semaphore = asyncio.BoundedSemaphore(max_concurrency)
+    limiter = RateLimiter(requests_per_minute, burst=max_concurrency)
+    
+    # The full outline is identical in every prompt, so serialize it only once
+    outline_json = orjson.dumps(outline, option=orjson.OPT_INDENT_2).decode()
+    
+    async def process_node(level_id: str, node: Dict):
+        """Generate and save the summary for a single node."""
         summary_file = os.path.join(summaries_dir, f"{level_id}.json")
         
-        # Skip if file already exists (for resumability)
-        if os.path.exists(summary_file):
-            print(f"Skipping {level_id} - summary already exists")
-        else:
-            print(f"Generating summary for {level_id}: {node.get('title', 'No title')}")
-            
-            summary = generate_summary(model, outline, node, commentary)
-            
-            if summary:
-                # Save the summary
-                with open(summary_file, 'w', encoding='utf-8') as f:
-                    json.dump(summary, f, ensure_ascii=False, indent=2)
-                print(f"Saved summary for {level_id}")
-                
-                # Add a small delay to avoid rate limiting
-                time.sleep(1)
-            else:
-                print(f"Failed to generate summary for {level_id}")
+        async with semaphore:
+            logger.info(f"Generating summary for {level_id}: {node.get('title', 'No title')}")
+            summary = await generate_summary(model, outline_json, node, commentary, limiter)
         
-        # Process children
-        for child in node.get('children', []):
-            process_node(child)
+        if summary:
+            # Save the summary
+            with open(summary_file, 'wb') as f:
+                f.write(orjson.dumps(summary, option=orjson.OPT_INDENT_2))
+            logger.info(f"Saved summary for {level_id}")
+        else:
+            logger.warning(f"Failed to generate summary for {level_id}")
     
-    # Process each top-level node
-    for node in outline:
-        process_node(node)
+    pending = collect_pending_nodes(outline, summaries_dir)
+    await asyncio.gather(*(process_node(level_id, node) for level_id, node in pending))
+
+def configure_logging() -> logging.handlers.QueueListener:
+    """Send progress messages through a queue so concurrent tasks never block on console writes."""
+    log_queue = queue.SimpleQueue()
+    
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter('%(message)s'))
+    listener = logging.handlers.QueueListener(log_queue, console)
+    
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    
+    listener.start()
+    return listener
 
 def main():
     """Main function to orchestrate the summary generation process."""
@@ -227,7 +305,11 @@ def main():
     
     # Generate summaries
     print("\nStarting summary generation...")
-    traverse_and_generate(model, outline, commentary, SUMMARIES_DIR)
+    listener = configure_logging()
+    try:
+        asyncio.run(traverse_and_generate(model, outline, commentary, SUMMARIES_DIR))
+    finally:
+        listener.stop()
     
     print("\nSummary generation complete!")
     print(f"Check the '{SUMMARIES_DIR}' directory for generated summaries.")
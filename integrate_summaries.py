@@ -3,10 +3,15 @@
 Integrate individual summaries back into the hierarchical outline structure.
 """
 
-import json
+import mmap
 import os
 import sys
-from typing import Dict, Any, List
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, NamedTuple, Optional, Set, Tuple
+
+from json_lists import write_json_list
+from level_ids import generate_level_id
 
 # =====================================================
 # CONFIGURATION - Update these paths as needed
@@ -14,18 +19,33 @@ from typing import Dict, Any, List
 OUTLINE_PATH = "data/chojuk/chapter_1/chapter_1_outline.json"
 SUMMARIES_DIR = "summaries"
 OUTPUT_PATH = "annotated_outline.json"
+MAX_LOAD_WORKERS = 32  # Threads used to read summary files in parallel
+COMPACT_OUTPUT = False  # Write the annotated outline without indentation (smaller, faster for large outlines)
 # =====================================================
 
+# Fields every outline node must have
+REQUIRED_FIELDS = ('level', 'number', 'title')
+
+class IntegrationStats(NamedTuple):
+    """Node counts gathered while integrating summaries."""
+    total_nodes: int
+    integrated_nodes: int
+
 def load_outline(outline_path: str) -> List[Dict]:
     """Load the original outline file."""
     try:
-        with open(outline_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open(outline_path, 'rb') as f:
+            # mmap cannot map an empty file, and an empty file is not JSON either
+            if os.fstat(f.fileno()).st_size == 0:
+                raise orjson.JSONDecodeError("Empty file", "", 0)
+            # Parse straight from a memory map to avoid an intermediate copy of large outlines
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as buffer:
+                return orjson.loads(buffer)
     except FileNotFoundError:
         print(f"Error: Outline file not found: {outline_path}")
         print("Please update the OUTLINE_PATH variable in the script.")
         sys.exit(1)
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         print(f"Error: Invalid JSON in outline file: {e}")
         sys.exit(1)
 
@@ -33,108 +53,126 @@ def load_summary(summaries_dir: str, level_id: str) -> Dict:
     """Load a summary file for a specific level."""
     summary_file = os.path.join(summaries_dir, f"{level_id}.json")
     
-    if not os.path.exists(summary_file):
+    try:
+        with open(summary_file, 'rb') as f:
+            return orjson.loads(f.read())
+    except FileNotFoundError:
         print(f"Warning: Summary file not found for {level_id}")
         return None
-    
-    try:
-        with open(summary_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         print(f"Error: Invalid JSON in summary file {summary_file}: {e}")
         return None
 
-def generate_level_id(node: Dict) -> str:
-    """Generate the level identifier used for summary filenames."""
-    level_id = node.get('number', '').replace('.', '-')
-    
-    if node.get('level') == 'chapter':
-        level_id = f"chapter-{level_id}"
-    elif node.get('level') == 'section':
-        level_id = f"section-{level_id}"
-    elif node.get('level') == 'subsection':
-        level_id = f"subsection-{level_id}"
-    elif node.get('level') == 'sub-subsection':
-        level_id = f"sub-subsection-{level_id}"
-    elif node.get('level') == 'sub-sub-subsection':
-        level_id = f"sub-sub-subsection-{level_id}"
-    elif node.get('level') == 'sub-sub-sub-subsection':
-        level_id = f"sub-sub-sub-subsection-{level_id}"
-    
-    return level_id
+def load_summaries(outline: List[Dict], summaries_dir: str, available: Set[str],
+                   max_workers: int = MAX_LOAD_WORKERS) -> Dict[str, Optional[Dict]]:
+    """Load the summary for every node in the outline, reading files in parallel.
+    
+    available is the set of level ids that have a summary file (see
+    list_summaries); only those files are opened.
+    """
+    level_ids = []
+    stack = list(outline)
+    while stack:
+        node = stack.pop()
+        level_ids.append(generate_level_id(node))
+        stack.extend(node.get('children', []))
+    
+    # Drop duplicate ids while keeping the first-seen order
+    level_ids = list(dict.fromkeys(level_ids))
+    
+    summaries = {}
+    to_load = []
+    for level_id in level_ids:
+        if level_id in available:
+            to_load.append(level_id)
+        else:
+            print(f"Warning: Summary file not found for {level_id}")
+            summaries[level_id] = None
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        loaded = executor.map(lambda level_id: load_summary(summaries_dir, level_id), to_load)
+        summaries.update(zip(to_load, loaded))
+    
+    return summaries
 
-def integrate_summaries(outline: List[Dict], summaries_dir: str) -> List[Dict]:
-    """Integrate summaries into the outline structure."""
+def integrate_summaries(outline: List[Dict], summaries: Dict[str, Optional[Dict]]) -> Tuple[List[Dict], IntegrationStats]:
+    """Integrate summaries into the outline structure.
     
-    def process_node(node: Dict) -> Dict:
-        """Process a single node and its children."""
-        # Create a copy of the node to avoid modifying the original
-        processed_node = {}
-        
-        # Copy all fields except verse_text_excerpt
-        for key, value in node.items():
-            if key != 'verse_text_excerpt':
-                processed_node[key] = value
+    The outline is modified in place: verse_text_excerpt is removed and a
+    summary is attached to each node. Copy the outline first if the original
+    is still needed. summaries maps each level identifier to its loaded
+    summary (see load_summaries). Nodes are counted during the same walk, so
+    no separate counting passes over the outline are needed.
+    """
+    
+    def process_node(node: Dict):
+        """Drop a single node's excerpt and attach its summary."""
+        node.pop('verse_text_excerpt', None)
         
         # Generate level identifier
         level_id = generate_level_id(node)
         
-        # Load and integrate summary
-        summary_data = load_summary(summaries_dir, level_id)
+        # Look up and integrate summary
+        summary_data = summaries.get(level_id)
         
         if summary_data:
             # Add the summary to the node
-            processed_node['summary'] = summary_data.get('summary', {})
+            node['summary'] = summary_data.get('summary', {})
             print(f"Integrated summary for {level_id}")
         else:
             print(f"No summary found for {level_id}, skipping...")
+    
+    total_nodes = 0
+    integrated_nodes = 0
+    stack = list(reversed(outline))
+    
+    while stack:
+        node = stack.pop()
+        process_node(node)
         
-        # Process children recursively
-        if 'children' in processed_node and processed_node['children']:
-            processed_node['children'] = [process_node(child) for child in processed_node['children']]
+        total_nodes += 1
+        if 'summary' in node:
+            integrated_nodes += 1
         
-        return processed_node
+        stack.extend(reversed(node.get('children', [])))
     
-    # Process all top-level nodes
-    return [process_node(node) for node in outline]
+    return outline, IntegrationStats(total_nodes, integrated_nodes)
 
-def save_annotated_outline(annotated_outline: List[Dict], output_path: str):
-    """Save the annotated outline to a file."""
+def save_annotated_outline(annotated_outline: List[Dict], output_path: str, pretty: bool = True):
+    """Save the annotated outline to a file, indented unless pretty is False.
+    
+    Top-level nodes are serialized and written one at a time, so only one
+    node's encoded JSON is held in memory at once. The file is byte-identical
+    to dumping the whole list in one call.
+    """
     try:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(annotated_outline, f, ensure_ascii=False, indent=2)
+        with open(output_path, 'wb') as f:
+            option = orjson.OPT_INDENT_2 if pretty else None
+            write_json_list(f, (orjson.dumps(node, option=option) for node in annotated_outline), pretty)
         print(f"Annotated outline saved to: {output_path}")
     except Exception as e:
         print(f"Error saving annotated outline: {e}")
         sys.exit(1)
 
-def count_nodes(outline: List[Dict]) -> int:
-    """Count the total number of nodes in the outline."""
-    def count_node(node: Dict) -> int:
-        count = 1  # Count the current node
-        for child in node.get('children', []):
-            count += count_node(child)
-        return count
-    
-    return sum(count_node(node) for node in outline)
-
-def count_summaries(summaries_dir: str) -> int:
-    """Count the number of summary files in the summaries directory."""
-    if not os.path.exists(summaries_dir):
-        return 0
+def list_summaries(summaries_dir: str) -> Set[str]:
+    """Return the level ids of all summary files in the summaries directory.
     
-    json_files = [f for f in os.listdir(summaries_dir) if f.endswith('.json')]
-    return len(json_files)
+    Raises FileNotFoundError if the directory does not exist.
+    """
+    with os.scandir(summaries_dir) as entries:
+        return {entry.name[:-len('.json')] for entry in entries if entry.name.endswith('.json')}
 
 def validate_structure(outline: List[Dict]) -> bool:
     """Validate that the outline structure is correct."""
     
-    def validate_node(node: Dict, path: str = "") -> bool:
+    stack = [(node, f"root[{i}]") for i, node in reversed(list(enumerate(outline)))]
+    
+    while stack:
+        node, path = stack.pop()
         current_path = f"{path}/{node.get('number', 'unknown')}"
         
         # Check required fields
-        required_fields = ['level', 'number', 'title']
-        for field in required_fields:
+        for field in REQUIRED_FIELDS:
             if field not in node:
                 print(f"Error: Missing required field '{field}' in node {current_path}")
                 return False
@@ -145,30 +183,14 @@ def validate_structure(outline: List[Dict]) -> bool:
                 print(f"Error: 'children' field must be a list in node {current_path}")
                 return False
             
-            for i, child in enumerate(node['children']):
-                if not validate_node(child, current_path):
-                    return False
-        
-        return True
-    
-    for i, node in enumerate(outline):
-        if not validate_node(node, f"root[{i}]"):
-            return False
+            stack.extend((child, current_path) for child in reversed(node['children']))
     
     return True
 
-def print_integration_stats(original_count: int, summaries_count: int, annotated_outline: List[Dict]):
+def print_integration_stats(stats: IntegrationStats, summaries_count: int):
     """Print statistics about the integration process."""
-    
-    def count_nodes_with_summaries(nodes: List[Dict]) -> int:
-        count = 0
-        for node in nodes:
-            if 'summary' in node:
-                count += 1
-            count += count_nodes_with_summaries(node.get('children', []))
-        return count
-    
-    integrated_count = count_nodes_with_summaries(annotated_outline)
+    original_count = stats.total_nodes
+    integrated_count = stats.integrated_nodes
     
     print("\n" + "="*50)
     print("INTEGRATION STATISTICS")
@@ -191,13 +213,11 @@ def main():
     print(f"Output file: {OUTPUT_PATH}")
     print()
     
-    # Validate inputs
-    if not os.path.exists(OUTLINE_PATH):
-        print(f"Error: Outline file not found: {OUTLINE_PATH}")
-        print("Please update the OUTLINE_PATH variable in the script.")
-        sys.exit(1)
-    
-    if not os.path.exists(SUMMARIES_DIR):
+    # List summaries once; this also validates the summaries directory.
+    # A missing outline file is reported by load_outline.
+    try:
+        available = list_summaries(SUMMARIES_DIR)
+    except FileNotFoundError:
         print(f"Error: Summaries directory not found: {SUMMARIES_DIR}")
         print("Please run generate_summaries.py first to create the summary files.")
         print("Or update the SUMMARIES_DIR variable in the script.")
@@ -213,23 +233,22 @@ def main():
         print("Error: Invalid outline structure detected.")
         sys.exit(1)
     
-    # Count nodes and summaries
-    original_count = count_nodes(outline)
-    summaries_count = count_summaries(SUMMARIES_DIR)
+    # Nodes are counted while integrating
+    summaries_count = len(available)
     
-    print(f"Found {original_count} nodes in outline")
     print(f"Found {summaries_count} summary files")
     
     # Integrate summaries
     print("\nIntegrating summaries into outline...")
-    annotated_outline = integrate_summaries(outline, SUMMARIES_DIR)
+    summaries = load_summaries(outline, SUMMARIES_DIR, available)
+    annotated_outline, stats = integrate_summaries(outline, summaries)
     
     # Save the result
     print(f"\nSaving annotated outline to {OUTPUT_PATH}...")
-    save_annotated_outline(annotated_outline, OUTPUT_PATH)
+    save_annotated_outline(annotated_outline, OUTPUT_PATH, pretty=not COMPACT_OUTPUT)
     
     # Print statistics
-    print_integration_stats(original_count, summaries_count, annotated_outline)
+    print_integration_stats(stats, summaries_count)
     
     print(f"\nIntegration complete! Check {OUTPUT_PATH} for the final result.")
 
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Streamed writing of large JSON lists.
+
+Shared by integrate_summaries.py and run_structured_analysis.py, which
+write their outlines one top-level node at a time.
+"""
+
+from typing import BinaryIO, Iterable
+
+def write_json_list(f: BinaryIO, encoded_items: Iterable[bytes], indent: bool = True) -> None:
+    """Write already-encoded JSON values to a binary file as a JSON list.
+
+    Items are written one at a time, so only one item's encoded JSON is held
+    in memory at once. With indent, each item must itself be encoded with a
+    two-space indent, and the bytes written are identical to dumping the
+    whole list with a two-space indent; without it, to a compact dump.
+    """
+    f.write(b'[')
+    empty = True
+    for encoded in encoded_items:
+        if not empty:
+            f.write(b',')
+        empty = False
+        if indent:
+            # Nest the item one level inside the list; raw newlines only
+            # occur between tokens since JSON strings escape them
+            f.write(b'\n  ' + encoded.replace(b'\n', b'\n  '))
+        else:
+            f.write(encoded)
+    f.write(b'\n]' if indent and not empty else b']')
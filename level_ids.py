@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Level identifiers used to name per-node summary files.
+
+Shared by generate_summaries.py, which writes the summary files, and
+integrate_summaries.py, which reads them back.
+"""
+
+from typing import Dict
+
+# Filename prefix for each outline level; nodes at other levels get no prefix
+LEVEL_PREFIXES = {
+    'chapter': 'chapter-',
+    'section': 'section-',
+    'subsection': 'subsection-',
+    'sub-subsection': 'sub-subsection-',
+    'sub-sub-subsection': 'sub-sub-subsection-',
+    'sub-sub-sub-subsection': 'sub-sub-sub-subsection-',
+}
+
+# Translation table turning outline numbers like "1.2.3" into "1-2-3"
+DOT_TO_DASH = str.maketrans('.', '-')
+
+def generate_level_id(node: Dict) -> str:
+    """Generate the level identifier used for summary filenames."""
+    level_id = node.get('number', '').translate(DOT_TO_DASH)
+    return f"{LEVEL_PREFIXES.get(node.get('level'), '')}{level_id}"
@@ -1,29 +1,59 @@
-import json
+import mmap
+import os
+import orjson
 from pathlib import Path
 
 def process_node_recursive(node):
     """
-    Recursively traverses the outline tree and modifies it in place:
+    Traverses the outline tree depth-first and modifies it in place:
     - If a node is a leaf node, leaves it as is
     - If a node has children, combines all verse_text_excerpt from its descendants
       and adds it to the node with the key "verse_text_excerpt"
     - Ensures verse_text_excerpt appears before children in the output JSON
     
+    The walk uses an explicit stack rather than recursion, visiting each parent
+    a second time once all of its children have been processed, so deep
+    outlines cannot hit Python's recursion limit.
+    
     Args:
-        node (dict): The current node in the outline tree to process.
+        node (dict): The root node of the (sub)tree to process.
         
     Returns:
         bool: True if this node or any of its descendants has verse text, False otherwise.
     """
-    # Check if this node has children
-    if "children" in node and node["children"]:
-        # This is a parent node
+    # Maps id(node) -> (node, has_text, reordered copy or None). Holding the
+    # node itself keeps it alive so its id cannot be reused mid-walk.
+    results = {}
+    stack = [(node, False)]
+    
+    while stack:
+        current, children_done = stack.pop()
+        
+        # Check if this node has children
+        if not ("children" in current and current["children"]):
+            # This is a leaf node, leave it as is
+            has_text = "verse_text_excerpt" in current and bool(current["verse_text_excerpt"])
+            results[id(current)] = (current, has_text, None)
+            continue
+        
+        if not children_done:
+            # Revisit this parent after all of its children (depth-first, post-order)
+            stack.append((current, True))
+            stack.extend((child, False) for child in reversed(current["children"]))
+            continue
+        
+        # This is a parent node whose children have all been processed
         has_text = False
         all_verse_texts = []
+        children = current["children"]
         
-        # Process all children first (depth-first traversal)
-        for child in node["children"]:
-            child_has_text = process_node_recursive(child)
+        for i, child in enumerate(children):
+            _, child_has_text, reordered_child = results.pop(id(child))
+            
+            # Swap in the child's reordered copy rather than rewriting it in place
+            if reordered_child is not None:
+                children[i] = child = reordered_child
+            
             has_text = has_text or child_has_text
             
             # If child has verse_text_excerpt, collect it
@@ -39,13 +69,14 @@ def process_node_recursive(node):
             verse_text = None
         
         # To ensure verse_text_excerpt appears before children in the output,
-        # we need to reorder the node dictionary
+        # build a new dictionary with the desired field order; the parent
+        # stores it in place of this node
+        reordered_node = None
         if has_text:
-            # Create a new ordered dictionary with the desired field order
             reordered_node = {}
             
             # Copy all fields except 'children' and 'verse_text_excerpt'
-            for key, value in node.items():
+            for key, value in current.items():
                 if key != "children" and key != "verse_text_excerpt":
                     reordered_node[key] = value
             
@@ -54,18 +85,17 @@ def process_node_recursive(node):
                 reordered_node["verse_text_excerpt"] = verse_text
             
             # Add children at the end
-            if "children" in node:
-                reordered_node["children"] = node["children"]
-            
-            # Replace the node's contents with our reordered version
-            # This is a bit of a hack but works because we're modifying the dict in-place
-            node.clear()
-            node.update(reordered_node)
+            reordered_node["children"] = children
         
-        return has_text
-    else:
-        # This is a leaf node, leave it as is
-        return "verse_text_excerpt" in node and bool(node["verse_text_excerpt"])
+        results[id(current)] = (current, has_text, reordered_node)
+    
+    # The root has no parent to swap it into, so update it in place
+    _, has_text, reordered_root = results[id(node)]
+    if reordered_root is not None:
+        node.clear()
+        node.update(reordered_root)
+    
+    return has_text
 
 def process_outline_json(input_json_data):
     """
@@ -87,6 +117,18 @@ def process_outline_json(input_json_data):
     
     return input_json_data
 
+def load_json_file(path):
+    """
+    Parses a JSON file straight from a memory map, avoiding an intermediate
+    copy of large outlines.
+    """
+    with open(path, 'rb') as f:
+        # mmap cannot map an empty file, and an empty file is not JSON either
+        if os.fstat(f.fileno()).st_size == 0:
+            raise orjson.JSONDecodeError("Empty file", "", 0)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as buffer:
+            return orjson.loads(buffer)
+
 if __name__ == "__main__":
     # chapter_dirs = list(Path("./data/chojuk").iterdir())
     # chapter_dirs.sort()
@@ -122,16 +164,14 @@ if __name__ == "__main__":
     try:
         # Read the input JSON file
         print(f"Reading outline from {text_outline_file}...")
-        outline_data_str = text_outline_file.read_text(encoding='utf-8')
-        outline_data = json.loads(outline_data_str)
+        outline_data = load_json_file(text_outline_file)
         
         # Process the outline, adding verse_text_excerpt to parent nodes
         print("Processing outline and combining verses for parent nodes...")
         processed_outline = process_outline_json(outline_data)
         
         # Save the updated outline with verse_text_excerpt at all levels
-        with open(output_file_name, "w", encoding='utf-8') as f:
-            json.dump(processed_outline, f, indent=2, ensure_ascii=False)
+        output_file_name.write_bytes(orjson.dumps(processed_outline, option=orjson.OPT_INDENT_2))
         
         print(f"Updated outline with combined verses saved to '{output_file_name}'")
         
@@ -1,22 +1,83 @@
-import json
+import mmap
+import os
+import re
+import orjson
 from pathlib import Path
 
+# A "verse_text_excerpt": "<string>" member together with one adjacent comma,
+# so removing the match leaves the surrounding object valid JSON. The key must
+# follow a ',' or '{' (kept as group 1), so a match can never start at an
+# escaped quote inside another string.
+_JSON_STRING = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+EXCERPT_MEMBER_RE = re.compile(
+    rb',\s*"verse_text_excerpt"\s*:\s*' + _JSON_STRING +
+    rb'|(\{\s*)"verse_text_excerpt"\s*:\s*' + _JSON_STRING + rb'\s*,\s*'
+)
+
 def remove_verse_excerpts_recursive(node):
     """
-    Recursively traverses the JSON structure and removes the 'verse_text_excerpt' key
+    Traverses the JSON structure and removes the 'verse_text_excerpt' key
     from each dictionary (node) if it exists.
+    Uses an explicit stack instead of recursion so deep trees are safe.
     Modifies the node in place.
     """
-    if isinstance(node, dict):
-        if "verse_text_excerpt" in node:
-            del node["verse_text_excerpt"]
-        
-        if "children" in node and isinstance(node["children"], list):
-            for child in node["children"]:
-                remove_verse_excerpts_recursive(child)
-    elif isinstance(node, list):
-        for item in node:
-            remove_verse_excerpts_recursive(item)
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, dict):
+            if "verse_text_excerpt" in current:
+                del current["verse_text_excerpt"]
+            
+            if "children" in current and isinstance(current["children"], list):
+                stack.extend(current["children"])
+        elif isinstance(current, list):
+            stack.extend(current)
+
+def remove_verse_excerpts_text(data):
+    """
+    Removes 'verse_text_excerpt' members directly from serialized JSON bytes,
+    without building the Python object tree. The rest of the document keeps
+    its original formatting. Members that cannot be removed textually (a
+    non-string value, or the only key in its object) are left in place.
+    Unlike remove_verse_excerpts_recursive, which only visits nodes reached
+    through lists and 'children', this removes string-valued members from
+    every object in the document, including nested ones such as a summary.
+    """
+    return EXCERPT_MEMBER_RE.sub(lambda match: match.group(1) or b'', data)
+
+def remove_verse_excerpts(data):
+    """
+    Returns the serialized JSON document with 'verse_text_excerpt' members
+    removed. The text filter handles string values and its output is checked
+    to be valid JSON. If it is not, the original document is parsed instead,
+    so malformed input raises orjson.JSONDecodeError rather than being
+    "cleaned". Members left over are removed with
+    remove_verse_excerpts_recursive and the document is re-serialized.
+    """
+    updated = remove_verse_excerpts_text(data)
+    try:
+        parsed = orjson.loads(updated)
+    except orjson.JSONDecodeError:
+        parsed = orjson.loads(data)
+    else:
+        if b'"verse_text_excerpt"' not in updated:
+            return updated
+
+    # Fall back to the parsed document for members the text filter could not remove
+    remove_verse_excerpts_recursive(parsed) # Process the data (could be a list or dict at root)
+    return orjson.dumps(parsed, option=orjson.OPT_INDENT_2)
+
+def remove_verse_excerpts_from_file(path):
+    """
+    Returns the JSON file at path with 'verse_text_excerpt' members removed,
+    filtering the memory-mapped bytes directly instead of reading a copy.
+    """
+    with open(path, 'rb') as f:
+        # mmap cannot map an empty file, and an empty file is not JSON either
+        if os.fstat(f.fileno()).st_size == 0:
+            raise orjson.JSONDecodeError("Empty file", "", 0)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as buffer:
+            return remove_verse_excerpts(buffer)
 
 def main():
     target_file_path_str = "/Users/tenzingayche/Desktop/multi_level_summaries/data/chapter_nine/chapter_one/multilevel_tree_chapter_1.json"
@@ -28,22 +89,18 @@ def main():
 
     try:
         print(f"Reading JSON data from: {target_file_path}")
-        original_data_str = target_file_path.read_text(encoding='utf-8')
-        data = json.loads(original_data_str)
-    except json.JSONDecodeError as e:
+        print("Removing 'verse_text_excerpt' fields...")
+        updated = remove_verse_excerpts_from_file(target_file_path)
+    except orjson.JSONDecodeError as e:
         print(f"Error decoding JSON from {target_file_path}: {e}")
         return
     except Exception as e:
         print(f"Error reading {target_file_path}: {e}")
         return
 
-    print("Removing 'verse_text_excerpt' fields...")
-    remove_verse_excerpts_recursive(data) # Process the data (could be a list or dict at root)
-
     try:
         print(f"Writing modified JSON data back to: {target_file_path}")
-        with open(target_file_path, "w", encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        target_file_path.write_bytes(updated)
         print("Successfully removed 'verse_text_excerpt' fields and updated the file.")
     except Exception as e:
         print(f"Error writing updated JSON to {target_file_path}: {e}")
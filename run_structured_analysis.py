@@ -5,16 +5,24 @@ Combines outline JSON, commentary text, and prompt template to generate
 hierarchical analysis of Buddhist root texts with Tibetan summaries.
 """
 
+import asyncio
+import functools
+import hashlib
 import json
+import mmap
 import os
+import re
+import stat
 import sys
+from pathlib import Path
 from typing import Dict, Any, List, Optional
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, ValidationError
 import google.generativeai as genai
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage
 from langgraph.graph import StateGraph, END
 from langgraph.graph.state import CompiledStateGraph
+from json_lists import write_json_list
 
 # =====================================================
 # CONFIGURATION - Update these paths as needed
@@ -23,17 +31,30 @@ PROMPT_TEMPLATE_FILE = "data/prompts/multi-level-summary-extractor-prompt.md"
 OUTLINE_JSON_FILE = "data/chojuk/chapter_1/updated_outline_with_verses.json"
 COMMENTARY_TEXT_FILE = "data/chojuk/chapter_1/chapter_1_commentary.txt"
 OUTPUT_FILE = "MLS.json"
+# Send each top-level outline node in its own request, concurrently.
+# Set to False to analyse a multi-chapter outline in a single request.
+SPLIT_TOP_LEVEL_NODES = True
+# Upper bound on requests in flight at once; each sends the full commentary and
+# may return up to 65k tokens, so keep this within your Gemini quota
+MAX_CONCURRENT_REQUESTS = 2
+# Validated LLM responses are cached here, keyed by a hash of the prompt, so
+# re-runs with unchanged inputs skip generation. Set to None to disable.
+CACHE_DIR = "mls_cache"
 # =====================================================
 
 # Pydantic Models for Structured Output
 class InterNodeRelationship(BaseModel):
     """Model for relationships between nodes in the hierarchy."""
+    model_config = ConfigDict(frozen=True, defer_build=True)
+
     related_node_id: str = Field(description="Identifier of the related node")
     relationship_type: str = Field(description="Type of relationship in Tibetan")
     conceptual_bridge: str = Field(description="Description of the conceptual connection in Tibetan")
 
 class Summary(BaseModel):
     """Model for node summary with all required fields in Tibetan."""
+    model_config = ConfigDict(frozen=True, defer_build=True)
+
     content_summary: str = Field(description="Concise summary (2-5 sentences) of core content in Tibetan")
     key_concepts: List[str] = Field(description="Primary philosophical terms or practices in Tibetan")
     transformative_goal: str = Field(description="Primary inner transformation this unit aims to facilitate in Tibetan")
@@ -46,6 +67,8 @@ class Summary(BaseModel):
 
 class Node(BaseModel):
     """Model for a hierarchical node with summary."""
+    model_config = ConfigDict(frozen=True, defer_build=True)
+
     level: str = Field(description="Level type (chapter, section, subsection, etc.)")
     number: str = Field(description="Node number/identifier")
     title: str = Field(description="Node title")
@@ -53,20 +76,32 @@ class Node(BaseModel):
     children: List['Node'] = Field(default_factory=list, description="Child nodes")
     summary: Summary = Field(description="Generated summary for this node")
 
-# Allow forward references
-Node.model_rebuild()
+# Parses and validates a JSON list of nodes in a single pass. Validators and
+# serializers are built on first use rather than at import, which also
+# resolves the forward reference in Node.children.
+NODES_ADAPTER = TypeAdapter(List[Node], config=ConfigDict(defer_build=True))
+
+# Matches the {{OUTLINE_JSON}} and {{COMMENTARY_TEXT}} template placeholders
+PLACEHOLDER_RE = re.compile(r"\{\{(OUTLINE_JSON|COMMENTARY_TEXT)\}\}")
 
 class AnalysisState(BaseModel):
     """State for the LangGraph workflow."""
+    model_config = ConfigDict(defer_build=True)
+
     prompt_template: str = Field(description="The prompt template")
     outline_json: str = Field(description="The outline JSON content")
     commentary_text: str = Field(description="The commentary text content")
-    final_prompt: str = Field(description="The combined prompt ready for LLM")
+    final_prompts: List[str] = Field(default_factory=list, description="The combined prompts ready for LLM, one per request")
     result_nodes: List[Node] = Field(default_factory=list, description="Final processed nodes with summaries")
     error_message: Optional[str] = Field(default=None, description="Any error that occurred")
 
+@functools.lru_cache(maxsize=1)
 def configure_llm():
-    """Configure the LLM for LangChain."""
+    """Configure the LLM for LangChain.
+    
+    The client is created once and reused, so its HTTP connection pool is
+    shared across calls.
+    """
     api_key = os.getenv('GEMINI_API_KEY')
     if not api_key:
         print("Error: GEMINI_API_KEY environment variable not set.")
@@ -82,31 +117,35 @@ def configure_llm():
         max_output_tokens=65536
     )
 
+def read_mapped_text(path: str) -> str:
+    """Decode a UTF-8 text file straight from a memory map."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return str(mm, 'utf-8')
+
 def load_input_files(state: AnalysisState) -> AnalysisState:
     """Load prompt template, outline JSON, and commentary text."""
     print("📁 Loading input files...")
     
     try:
         # Load prompt template
-        with open(PROMPT_TEMPLATE_FILE, 'r', encoding='utf-8') as f:
-            prompt_template = f.read()
+        prompt_template = Path(PROMPT_TEMPLATE_FILE).read_text(encoding='utf-8')
         print(f"✅ Loaded prompt template ({len(prompt_template)} characters)")
         
         # Load outline JSON
-        with open(OUTLINE_JSON_FILE, 'r', encoding='utf-8') as f:
-            outline_content = f.read()
+        outline_content = Path(OUTLINE_JSON_FILE).read_text(encoding='utf-8')
         print(f"✅ Loaded outline JSON ({len(outline_content)} characters)")
         
         # Load commentary text
-        with open(COMMENTARY_TEXT_FILE, 'r', encoding='utf-8') as f:
-            commentary_text = f.read()
+        commentary_text = read_mapped_text(COMMENTARY_TEXT_FILE)
         print(f"✅ Loaded commentary text ({len(commentary_text)} characters)")
         
         return AnalysisState(
             prompt_template=prompt_template,
             outline_json=outline_content,
-            commentary_text=commentary_text,
-            final_prompt=""
+            commentary_text=commentary_text
         )
         
     except FileNotFoundError as e:
@@ -114,7 +153,6 @@ def load_input_files(state: AnalysisState) -> AnalysisState:
             prompt_template="",
             outline_json="",
             commentary_text="",
-            final_prompt="",
             error_message=f"File not found: {e.filename}"
         )
     except Exception as e:
@@ -122,10 +160,57 @@ def load_input_files(state: AnalysisState) -> AnalysisState:
             prompt_template="",
             outline_json="",
             commentary_text="",
-            final_prompt="",
             error_message=f"Failed to load files: {str(e)}"
         )
 
+def fill_prompt_template(prompt_template: str, outline_json: str, commentary_text: str) -> str:
+    """Insert outline JSON and commentary text into the prompt template.
+    
+    All replacement spans are located in the template first and the prompt
+    is assembled with a single join, so the text is copied only once.
+    """
+    # Assuming the template has placeholders like {{OUTLINE_JSON}} and {{COMMENTARY_TEXT}}
+    substitutions = {
+        "OUTLINE_JSON": outline_json,
+        "COMMENTARY_TEXT": commentary_text,
+    }
+    
+    # (start, end, replacement) spans of the template to replace
+    spans = []
+    found = set()
+    for match in PLACEHOLDER_RE.finditer(prompt_template):
+        found.add(match.group(1))
+        spans.append((match.start(), match.end(), substitutions[match.group(1)]))
+    
+    # Fall back to the section markers for placeholders the template lacks
+    if "OUTLINE_JSON" not in found and "## **Chapter Structure:**" in prompt_template:
+        # Replace the JSON block in the existing template
+        start_marker = "```json"
+        end_marker = "```\n\n## **Chapter Commentary:**"
+        start_idx = prompt_template.find(start_marker)
+        end_idx = prompt_template.find(end_marker)
+        if start_idx > -1 and end_idx > -1:
+            spans.append((start_idx + len(start_marker) + 1, end_idx, outline_json))
+    
+    if "COMMENTARY_TEXT" not in found and "## **Chapter Commentary:**" in prompt_template:
+        # Replace the commentary section
+        start_marker = "## **Chapter Commentary:**"
+        end_marker = "## **Task:**"
+        start_idx = prompt_template.find(start_marker)
+        end_idx = prompt_template.find(end_marker)
+        if start_idx > -1 and end_idx > -1:
+            spans.append((start_idx + len(start_marker) + 2, end_idx, commentary_text + "\n\n"))
+    
+    parts = []
+    position = 0
+    for start, end, replacement in sorted(spans):
+        parts.append(prompt_template[position:start])
+        parts.append(replacement)
+        position = end
+    parts.append(prompt_template[position:])
+    
+    return "".join(parts)
+
 def compose_prompt(state: AnalysisState) -> AnalysisState:
     """Combine outline JSON and commentary text into the prompt template."""
     if state.error_message:
@@ -134,39 +219,23 @@ def compose_prompt(state: AnalysisState) -> AnalysisState:
     print("🔧 Composing final prompt...")
     
     try:
-        # Replace placeholders in prompt template
-        # Assuming the template has placeholders like {{OUTLINE_JSON}} and {{COMMENTARY_TEXT}}
-        final_prompt = state.prompt_template
-        
-        # If template has specific placeholders, replace them
-        if "{{OUTLINE_JSON}}" in final_prompt:
-            final_prompt = final_prompt.replace("{{OUTLINE_JSON}}", state.outline_json)
-        elif "## **Chapter Structure:**" in final_prompt:
-            # Replace the JSON block in the existing template
-            start_marker = "```json"
-            end_marker = "```\n\n## **Chapter Commentary:**"
-            start_idx = final_prompt.find(start_marker)
-            end_idx = final_prompt.find(end_marker)
-            if start_idx > -1 and end_idx > -1:
-                final_prompt = (final_prompt[:start_idx + len(start_marker) + 1] + 
-                              state.outline_json + 
-                              final_prompt[end_idx:])
+        # One outline chunk per request; split top-level nodes into separate requests
+        outline_chunks = [state.outline_json]
+        if SPLIT_TOP_LEVEL_NODES:
+            top_level_nodes = json.loads(state.outline_json)
+            if isinstance(top_level_nodes, list) and len(top_level_nodes) > 1:
+                outline_chunks = [json.dumps([node], ensure_ascii=False, indent=2)
+                                  for node in top_level_nodes]
         
-        if "{{COMMENTARY_TEXT}}" in final_prompt:
-            final_prompt = final_prompt.replace("{{COMMENTARY_TEXT}}", state.commentary_text)
-        elif "## **Chapter Commentary:**" in final_prompt:
-            # Replace the commentary section
-            start_marker = "## **Chapter Commentary:**"
-            end_marker = "## **Task:**"
-            start_idx = final_prompt.find(start_marker)
-            end_idx = final_prompt.find(end_marker)
-            if start_idx > -1 and end_idx > -1:
-                final_prompt = (final_prompt[:start_idx + len(start_marker) + 2] + 
-                              state.commentary_text + 
-                              "\n\n" + final_prompt[end_idx:])
-        
-        state.final_prompt = final_prompt
-        print(f"✅ Composed final prompt ({len(final_prompt)} characters)")
+        state.final_prompts = [
+            fill_prompt_template(state.prompt_template, outline_chunk, state.commentary_text)
+            for outline_chunk in outline_chunks
+        ]
+        total_characters = sum(len(prompt) for prompt in state.final_prompts)
+        if len(state.final_prompts) == 1:
+            print(f"✅ Composed final prompt ({total_characters} characters)")
+        else:
+            print(f"✅ Composed {len(state.final_prompts)} prompts, one per top-level node ({total_characters} characters)")
         
     except Exception as e:
         state.error_message = f"Error composing prompt: {str(e)}"
@@ -174,59 +243,124 @@ def compose_prompt(state: AnalysisState) -> AnalysisState:
     
     return state
 
-def generate_analysis(state: AnalysisState) -> AnalysisState:
-    """Generate the complete hierarchical analysis using the composed prompt."""
+async def stream_response(llm, prompt: str) -> str:
+    """Stream one prompt through the LLM and return the response text without code fences."""
+    message = HumanMessage(content=prompt)
+    
+    # Stream the response so chunks are collected as they are generated
+    chunks = [chunk.content async for chunk in llm.astream([message])]
+    
+    response_text = "".join(chunks).strip()
+    print(f"📄 Received response ({len(response_text)} characters)")
+    
+    # Clean JSON formatting, removing any markdown fences
+    return (response_text
+            .removeprefix('```json')
+            .removeprefix('```')
+            .removesuffix('```')
+            .strip())
+
+def response_cache_path(prompt: str) -> Optional[Path]:
+    """Return the cache file for a prompt's response, or None if caching is disabled."""
+    if not CACHE_DIR:
+        return None
+    digest = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+    return Path(CACHE_DIR) / f"{digest}.json"
+
+async def fetch_response(prompt: str, semaphore: asyncio.BoundedSemaphore) -> List[Node]:
+    """Return the validated nodes for one prompt.
+    
+    A cached response is reused if there is one. Otherwise the prompt is sent
+    to the LLM, holding the semaphore only while the request is in flight, and
+    the response is cached as soon as it validates, so it is kept even if
+    another prompt in the same run fails.
+    """
+    cache_path = response_cache_path(prompt)
+    response_text = None
+    if cache_path is not None:
+        try:
+            response_text = cache_path.read_text(encoding='utf-8')
+            print(f"♻️ Reusing cached response from {cache_path}")
+        except FileNotFoundError:
+            pass
+    
+    cached = response_text is not None
+    if not cached:
+        async with semaphore:
+            response_text = await stream_response(configure_llm(), prompt)
+    
+    # Parse the JSON response and validate it into Node models in one pass
+    try:
+        nodes = NODES_ADAPTER.validate_json(response_text)
+    except ValidationError as e:
+        if any(error['type'] == 'json_invalid' for error in e.errors()):
+            print("📝 Response preview:", response_text[:500])
+        raise
+    
+    if not cached:
+        cache_response(prompt, response_text)
+    return nodes
+
+def cache_response(prompt: str, response_text: str):
+    """Store a validated response so later runs with the same prompt can reuse it."""
+    cache_path = response_cache_path(prompt)
+    if cache_path is not None:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        cache_path.write_text(response_text, encoding='utf-8')
+
+async def generate_analysis(state: AnalysisState) -> AnalysisState:
+    """Generate the complete hierarchical analysis using the composed prompts.
+    
+    Up to MAX_CONCURRENT_REQUESTS prompts are in flight at once and the
+    resulting node lists are concatenated in prompt order. Prompts with a
+    cached response are not sent.
+    """
     if state.error_message:
         return state
     
     print("🤖 Generating comprehensive analysis with Gemini 2.5 Pro...")
-    llm = configure_llm()
     
-    try:
-        message = HumanMessage(content=state.final_prompt)
-        response = llm.invoke([message])
-        
-        # Parse the JSON response
-        response_text = response.content.strip()
-        print(f"📄 Received response ({len(response_text)} characters)")
-        
-        # Clean JSON formatting
-        if response_text.startswith('```json'):
-            response_text = response_text[7:]
-        elif response_text.startswith('```'):
-            response_text = response_text[3:]
-        if response_text.endswith('```'):
-            response_text = response_text[:-3]
-        
-        response_text = response_text.strip()
+    semaphore = asyncio.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+    
+    # Collect every outcome so one failed prompt does not cancel the others
+    results = await asyncio.gather(
+        *(fetch_response(prompt, semaphore) for prompt in state.final_prompts),
+        return_exceptions=True
+    )
+    
+    result_nodes = []
+    for result in results:
+        if isinstance(result, ValidationError):
+            if any(error['type'] == 'json_invalid' for error in result.errors()):
+                error_message = f"Invalid JSON response: {result}"
+                print(f"❌ JSON parsing error: {result}")
+            else:
+                error_message = f"Validation error: {result}"
+                print(f"❌ Pydantic validation error: {result}")
+        elif isinstance(result, BaseException):
+            error_message = f"Error calling LLM: {str(result)}"
+            print(f"❌ LLM error: {result}")
+        else:
+            result_nodes.extend(result)
+            continue
         
-        # Parse the JSON response
-        try:
-            analysis_data = json.loads(response_text)
-            
-            # Convert to Node models with validation
-            result_nodes = []
-            for node_data in analysis_data:
-                node = Node(**node_data)
-                result_nodes.append(node)
-            
-            state.result_nodes = result_nodes
-            print("✅ Analysis generation and validation complete")
-            
-        except json.JSONDecodeError as e:
-            state.error_message = f"Invalid JSON response: {e}"
-            print(f"❌ JSON parsing error: {e}")
-            print("📝 Response preview:", response_text[:500])
-        except Exception as e:
-            state.error_message = f"Validation error: {e}"
-            print(f"❌ Pydantic validation error: {e}")
-            
-    except Exception as e:
-        state.error_message = f"Error calling LLM: {str(e)}"
-        print(f"❌ LLM error: {e}")
+        # Report the first failure; the others have been printed above
+        if not state.error_message:
+            state.error_message = error_message
+    
+    if not state.error_message:
+        state.result_nodes = result_nodes
+        print("✅ Analysis generation and validation complete")
     
     return state
 
+def write_nodes_json(nodes: List[Node], f) -> None:
+    """Write nodes to a binary file as an indented JSON list, one node at a time.
+    
+    The bytes written are identical to NODES_ADAPTER.dump_json(nodes, indent=2).
+    """
+    write_json_list(f, (node.model_dump_json(indent=2).encode('utf-8') for node in nodes))
+
 def save_output(state: AnalysisState) -> AnalysisState:
     """Save the structured output to MLS.json file."""
     if state.error_message:
@@ -236,16 +370,13 @@ def save_output(state: AnalysisState) -> AnalysisState:
     print(f"💾 Saving Multi-Level Summary to {OUTPUT_FILE}...")
     
     try:
-        # Convert to dict for JSON serialization
-        output_data = [node.model_dump() for node in state.result_nodes]
-        
-        with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, ensure_ascii=False, indent=2)
+        with open(OUTPUT_FILE, 'wb') as f:
+            write_nodes_json(state.result_nodes, f)
         
         print(f"✅ Multi-Level Summary saved successfully to: {OUTPUT_FILE}")
         
         # Print summary statistics
-        total_nodes = sum(count_nodes(node) for node in state.result_nodes)
+        total_nodes = count_nodes(state.result_nodes)
         print(f"📊 Generated summaries for {total_nodes} nodes across the hierarchy")
         
     except Exception as e:
@@ -254,15 +385,22 @@ def save_output(state: AnalysisState) -> AnalysisState:
     
     return state
 
-def count_nodes(node: Node) -> int:
-    """Recursively count all nodes in the hierarchy."""
-    count = 1  # Count this node
-    for child in node.children:
-        count += count_nodes(child)
+def count_nodes(nodes: List[Node]) -> int:
+    """Count all nodes in the hierarchies rooted at the given nodes."""
+    stack = list(nodes)
+    count = 0
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children)
     return count
 
+@functools.lru_cache(maxsize=1)
 def create_workflow() -> CompiledStateGraph:
-    """Create and compile the LangGraph workflow."""
+    """Create and compile the LangGraph workflow.
+    
+    The compiled graph is reusable, so it is built once and cached.
+    """
     
     # Create the graph
     workflow = StateGraph(AnalysisState)
@@ -304,7 +442,11 @@ def main():
     ]
     
     for file_path, file_type in files_to_check:
-        if not os.path.exists(file_path):
+        try:
+            is_file = stat.S_ISREG(os.stat(file_path).st_mode)
+        except OSError:
+            is_file = False
+        if not is_file:
             print(f"❌ Error: {file_type} not found: {file_path}")
             print("Please update the configuration section in the script.")
             sys.exit(1)
@@ -319,12 +461,11 @@ def main():
     initial_state = AnalysisState(
         prompt_template="",
         outline_json="",
-        commentary_text="",
-        final_prompt=""
+        commentary_text=""
     )
     
-    # Run the workflow
-    final_state = workflow.invoke(initial_state)
+    # Run the workflow (generate_analysis is an async node)
+    final_state = asyncio.run(workflow.ainvoke(initial_state))
     
     if final_state.error_message:
         print(f"❌ Workflow failed: {final_state.error_message}")
@@ -0,0 +1,163 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+from google.api_core import exceptions as google_exceptions
+import generate_summaries
+from generate_summaries import (RateLimiter, collect_pending_nodes, generate_summary,
+                                get_retry_after, request_with_retry)
+
+
+class FakeClock:
+    """Stands in for time.monotonic and asyncio.sleep so waits take no real time"""
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+class FakeModel:
+    """Raises the queued errors from generate_content_async, then returns the response"""
+    def __init__(self, errors, response=None):
+        self.errors = list(errors)
+        self.response = response
+        self.calls = 0
+
+    async def generate_content_async(self, prompt):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.response
+
+
+def rate_limited(retry_after=None):
+    """Build the 429 error Gemini raises, optionally with a Retry-After header"""
+    headers = {} if retry_after is None else {'Retry-After': retry_after}
+    return google_exceptions.ResourceExhausted("quota exceeded", response=SimpleNamespace(headers=headers))
+
+
+class ClockTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        for patcher in (mock.patch.object(generate_summaries, 'time', self.clock),
+                        mock.patch('asyncio.sleep', self.clock.sleep)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class TestRateLimiter(ClockTestCase):
+    async def test_burst_then_spacing(self):
+        """A full bucket allows a burst, after which calls are spaced by the rate"""
+        limiter = RateLimiter(60, burst=3)
+        for _ in range(3):
+            await limiter.acquire()
+        self.assertEqual(self.clock.sleeps, [])
+
+        await limiter.acquire()
+        self.assertEqual(self.clock.sleeps, [1.0])
+
+    async def test_refill_is_capped_at_burst(self):
+        """Idle time refills tokens at the rate, but never beyond the burst size"""
+        limiter = RateLimiter(120, burst=2)
+        await limiter.acquire()
+        await limiter.acquire()
+
+        self.clock.now += 0.5
+        await limiter.acquire()
+        self.assertEqual(self.clock.sleeps, [])
+
+        self.clock.now += 60
+        await limiter.acquire()
+        await limiter.acquire()
+        self.assertEqual(self.clock.sleeps, [])
+        await limiter.acquire()
+        self.assertEqual(self.clock.sleeps, [0.5])
+
+
+class TestGetRetryAfter(unittest.TestCase):
+    def test_header_value(self):
+        """A numeric Retry-After header is returned in seconds"""
+        self.assertEqual(get_retry_after(rate_limited('7')), 7.0)
+
+    def test_missing_or_unusable_header(self):
+        """No response, no header or a non-numeric header give None"""
+        for error in (google_exceptions.ResourceExhausted("quota exceeded"),
+                      rate_limited(),
+                      rate_limited('Wed, 21 Oct 2015 07:28:00 GMT')):
+            with self.subTest(error=error):
+                self.assertIsNone(get_retry_after(error))
+
+
+class TestRequestWithRetry(ClockTestCase):
+    async def test_retries_then_succeeds(self):
+        """Rate-limit errors back off exponentially, or by Retry-After, until a call succeeds"""
+        model = FakeModel([rate_limited(), rate_limited(), rate_limited('7')], response="ok")
+        limiter = RateLimiter(60, burst=10)
+
+        with self.assertLogs('generate_summaries', 'WARNING'):
+            self.assertEqual(await request_with_retry(model, "prompt", limiter), "ok")
+        base = generate_summaries.RETRY_BASE_DELAY
+        self.assertEqual(self.clock.sleeps, [base, base * 2, 7.0])
+        self.assertEqual(model.calls, 4)
+
+    async def test_last_error_propagates_at_retry_limit(self):
+        """After MAX_RETRIES retries the final ResourceExhausted is raised"""
+        last_error = rate_limited()
+        model = FakeModel([rate_limited(), rate_limited(), last_error])
+        limiter = RateLimiter(60, burst=10)
+
+        with mock.patch.object(generate_summaries, 'MAX_RETRIES', 2), \
+                self.assertLogs('generate_summaries', 'WARNING'):
+            with self.assertRaises(google_exceptions.ResourceExhausted) as raised:
+                await request_with_retry(model, "prompt", limiter)
+        self.assertIs(raised.exception, last_error)
+        self.assertEqual(model.calls, 3)
+
+    async def test_generate_summary_returns_none_at_retry_limit(self):
+        """generate_summary logs the exhausted retries and returns None"""
+        model = FakeModel([rate_limited(), rate_limited()])
+        node = {"level": "chapter", "number": "1", "title": "Chapter"}
+
+        with mock.patch.object(generate_summaries, 'MAX_RETRIES', 1), \
+                self.assertLogs('generate_summaries', 'WARNING') as logs:
+            summary = await generate_summary(model, "[]", node, "", RateLimiter(60, burst=10))
+        self.assertIsNone(summary)
+        self.assertIn("Error generating summary for node 1", logs.output[-1])
+
+
+class TestCollectPendingNodes(unittest.TestCase):
+    def setUp(self):
+        self.summaries_dir = Path(tempfile.mkdtemp(prefix="summaries_test_"))
+        self.addCleanup(shutil.rmtree, self.summaries_dir, ignore_errors=True)
+
+    def test_document_order_skipping_saved_summaries(self):
+        """Nodes are returned depth-first in document order, skipping saved summaries"""
+        outline = [
+            {"level": "chapter", "number": "1", "children": [
+                {"level": "section", "number": "1.1", "children": [
+                    {"level": "subsection", "number": "1.1.1"},
+                ]},
+                {"level": "section", "number": "1.2"},
+            ]},
+            {"level": "chapter", "number": "2", "children": [
+                {"level": "section", "number": "2.1"},
+            ]},
+        ]
+        (self.summaries_dir / "section-1-2.json").write_bytes(b'{}')
+
+        pending = collect_pending_nodes(outline, str(self.summaries_dir))
+        self.assertEqual([level_id for level_id, _ in pending],
+                         ["chapter-1", "section-1-1", "subsection-1-1-1", "chapter-2", "section-2-1"])
+        self.assertIs(pending[0][1], outline[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import contextlib
+import copy
+import io
+import shutil
+import tempfile
+import unittest
+import orjson
+from pathlib import Path
+from integrate_summaries import (IntegrationStats, integrate_summaries, list_summaries,
+                                 load_summaries, save_annotated_outline)
+
+ANNOTATED_OUTLINE = [
+    {
+        "level": "chapter",
+        "number": "1",
+        "title": "First chapter",
+        "summary": {"content_summary": "multi-line\n  summary", "key_concepts": []},
+        "children": [{"level": "section", "number": "1.1", "title": "བདེ་གཤེགས་", "children": []}],
+    },
+]
+
+# Section 1.1 appears twice, so both nodes share the level id section-1-1
+OUTLINE = [
+    {
+        "level": "chapter",
+        "number": "1",
+        "title": "First chapter",
+        "verse_text_excerpt": "verses 1-4",
+        "children": [
+            {"level": "section", "number": "1.1", "title": "Section 1.1", "verse_text_excerpt": "verses 1-2", "children": []},
+            {"level": "section", "number": "1.1", "title": "Repeated section 1.1", "children": []},
+            {"level": "section", "number": "1.2", "title": "Section 1.2", "verse_text_excerpt": "verses 3-4", "children": []},
+        ],
+    },
+    {"level": "chapter", "number": "2", "title": "Second chapter", "children": []},
+]
+
+SUMMARIES = {
+    "chapter-1": {"level": "1", "summary": {"content_summary": "ལེའུ་དང་པོ།"}},
+    "section-1-1": {"level": "1.1", "summary": {"content_summary": "ས་བཅད་དང་པོ།"}},
+}
+
+
+class TestSaveAnnotatedOutline(unittest.TestCase):
+    def setUp(self):
+        test_dir = Path(tempfile.mkdtemp(prefix="integrate_test_"))
+        self.addCleanup(shutil.rmtree, test_dir, ignore_errors=True)
+        self.output_path = test_dir / "annotated.json"
+    
+    def save(self, annotated_outline, pretty):
+        """Save quietly and return the bytes written"""
+        with contextlib.redirect_stdout(io.StringIO()):
+            save_annotated_outline(annotated_outline, self.output_path, pretty=pretty)
+        return self.output_path.read_bytes()
+    
+    def test_pretty_and_compact_output(self):
+        """The outline is saved indented by default and compact when pretty is False"""
+        self.assertEqual(self.save(ANNOTATED_OUTLINE, pretty=True),
+                         orjson.dumps(ANNOTATED_OUTLINE, option=orjson.OPT_INDENT_2))
+        self.assertEqual(self.save(ANNOTATED_OUTLINE, pretty=False), orjson.dumps(ANNOTATED_OUTLINE))
+
+
+
+class TestLoadAndIntegrateSummaries(unittest.TestCase):
+    def setUp(self):
+        self.summaries_dir = Path(tempfile.mkdtemp(prefix="summaries_test_"))
+        self.addCleanup(shutil.rmtree, self.summaries_dir, ignore_errors=True)
+        for level_id, summary in SUMMARIES.items():
+            (self.summaries_dir / f"{level_id}.json").write_bytes(orjson.dumps(summary))
+        self.outline = copy.deepcopy(OUTLINE)
+    
+    def load(self):
+        """Load summaries for the outline and return them with the printed lines"""
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            available = list_summaries(str(self.summaries_dir))
+            summaries = load_summaries(self.outline, str(self.summaries_dir), available, max_workers=2)
+        return summaries, output.getvalue().splitlines()
+    
+    def test_load_summaries(self):
+        """Each level id is loaded once; ids without a file are None and warned about once"""
+        summaries, printed = self.load()
+        self.assertEqual(summaries, {
+            "chapter-1": SUMMARIES["chapter-1"],
+            "section-1-1": SUMMARIES["section-1-1"],
+            "section-1-2": None,
+            "chapter-2": None,
+        })
+        self.assertCountEqual(printed, [
+            "Warning: Summary file not found for section-1-2",
+            "Warning: Summary file not found for chapter-2",
+        ])
+    
+    def test_integrate_summaries(self):
+        """Summaries are attached to every matching node, excerpts are dropped and nodes counted"""
+        summaries, _ = self.load()
+        with contextlib.redirect_stdout(io.StringIO()):
+            annotated, stats = integrate_summaries(self.outline, summaries)
+        
+        self.assertIs(annotated, self.outline)
+        self.assertEqual(stats, IntegrationStats(total_nodes=5, integrated_nodes=3))
+        self.assertEqual(annotated, [
+            {
+                "level": "chapter",
+                "number": "1",
+                "title": "First chapter",
+                "children": [
+                    {"level": "section", "number": "1.1", "title": "Section 1.1", "children": [],
+                     "summary": SUMMARIES["section-1-1"]["summary"]},
+                    {"level": "section", "number": "1.1", "title": "Repeated section 1.1", "children": [],
+                     "summary": SUMMARIES["section-1-1"]["summary"]},
+                    {"level": "section", "number": "1.2", "title": "Section 1.2", "children": []},
+                ],
+                "summary": SUMMARIES["chapter-1"]["summary"],
+            },
+            {"level": "chapter", "number": "2", "title": "Second chapter", "children": []},
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
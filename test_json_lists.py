@@ -0,0 +1,35 @@
+import io
+import unittest
+import orjson
+from json_lists import write_json_list
+
+ITEMS = [
+    {
+        "number": "1",
+        "title": "First line\nsecond line",
+        "summary": {"content_summary": "a \"quoted\"\nmulti-line\n  indented summary", "key_concepts": []},
+        "children": [{"number": "1.1", "title": "བདེ་གཤེགས་\n\n", "children": []}],
+    },
+    {"number": "2", "title": "\\n is not a newline", "children": []},
+]
+
+
+class TestWriteJsonList(unittest.TestCase):
+    def write(self, items, indent):
+        """Stream the items through write_json_list and return the bytes written"""
+        option = orjson.OPT_INDENT_2 if indent else None
+        buffer = io.BytesIO()
+        write_json_list(buffer, (orjson.dumps(item, option=option) for item in items), indent)
+        return buffer.getvalue()
+
+    def test_matches_whole_list_dump(self):
+        """Streamed output equals a single dump of the whole list, indented or compact"""
+        for items in ([], ITEMS[:1], ITEMS):
+            with self.subTest(items=len(items)):
+                self.assertEqual(self.write(items, indent=True),
+                                 orjson.dumps(items, option=orjson.OPT_INDENT_2))
+                self.assertEqual(self.write(items, indent=False), orjson.dumps(items))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,100 +1,103 @@
-import json
+import shutil
+import tempfile
 import unittest
-import copy
+import orjson
 from pathlib import Path
 from outline_parser import process_outline_json, process_node_recursive
 
-class TestOutlineParser(unittest.TestCase):
-    def setUp(self):
-        # Create dummy outline data for testing
-        self.dummy_outline = [
+# Dummy outline data shared by all tests; tests copy it before mutating
+DUMMY_OUTLINE = [
+    {
+        "level": "chapter",
+        "number": "1",
+        "title": "Test Chapter",
+        "verses_span": "1-10",
+        "children": [
             {
-                "level": "chapter",
-                "number": "1",
-                "title": "Test Chapter",
-                "verses_span": "1-10",
+                "level": "section",
+                "number": "1.1",
+                "title": "Test Section 1",
+                "verses_span": "1-5",
                 "children": [
                     {
-                        "level": "section",
-                        "number": "1.1",
-                        "title": "Test Section 1",
-                        "verses_span": "1-5",
-                        "children": [
-                            {
-                                "level": "subsection",
-                                "number": "1.1.1",
-                                "title": "Test Subsection 1",
-                                "verses_span": "1-3",
-                                "verse_text_excerpt": "These are verses 1-3 of the root text.",
-                                "children": []
-                            },
-                            {
-                                "level": "subsection",
-                                "number": "1.1.2",
-                                "title": "Test Subsection 2",
-                                "verses_span": "4-5",
-                                "verse_text_excerpt": "These are verses 4-5 of the root text.",
-                                "children": []
-                            }
-                        ]
+                        "level": "subsection",
+                        "number": "1.1.1",
+                        "title": "Test Subsection 1",
+                        "verses_span": "1-3",
+                        "verse_text_excerpt": "These are verses 1-3 of the root text.",
+                        "children": []
                     },
                     {
-                        "level": "section",
-                        "number": "1.2",
-                        "title": "Test Section 2",
-                        "verses_span": "6-10",
-                        "children": [
-                            {
-                                "level": "subsection",
-                                "number": "1.2.1",
-                                "title": "Test Subsection 3",
-                                "verses_span": "6-8",
-                                "verse_text_excerpt": "These are verses 6-8 of the root text.",
-                                "children": []
-                            },
-                            {
-                                "level": "subsection",
-                                "number": "1.2.2",
-                                "title": "Test Subsection 4",
-                                "verses_span": "9-10",
-                                "verse_text_excerpt": "These are verses 9-10 of the root text.",
-                                "children": []
-                            }
-                        ]
+                        "level": "subsection",
+                        "number": "1.1.2",
+                        "title": "Test Subsection 2",
+                        "verses_span": "4-5",
+                        "verse_text_excerpt": "These are verses 4-5 of the root text.",
+                        "children": []
                     }
                 ]
-            }
-        ]
-        
-        # Expected output after processing
-        self.expected_output = [
-            {
-                "level": "chapter",
-                "number": "1",
-                "title": "Test Chapter",
-                "verses_span": "1-10",
-                "combined_verse_text_excerpt": "These are verses 1-3 of the root text.\n\nThese are verses 4-5 of the root text.\n\nThese are verses 6-8 of the root text.\n\nThese are verses 9-10 of the root text."
-            },
-            {
-                "level": "section",
-                "number": "1.1",
-                "title": "Test Section 1",
-                "verses_span": "1-5",
-                "combined_verse_text_excerpt": "These are verses 1-3 of the root text.\n\nThese are verses 4-5 of the root text."
             },
             {
                 "level": "section",
                 "number": "1.2",
                 "title": "Test Section 2",
                 "verses_span": "6-10",
-                "combined_verse_text_excerpt": "These are verses 6-8 of the root text.\n\nThese are verses 9-10 of the root text."
+                "children": [
+                    {
+                        "level": "subsection",
+                        "number": "1.2.1",
+                        "title": "Test Subsection 3",
+                        "verses_span": "6-8",
+                        "verse_text_excerpt": "These are verses 6-8 of the root text.",
+                        "children": []
+                    },
+                    {
+                        "level": "subsection",
+                        "number": "1.2.2",
+                        "title": "Test Subsection 4",
+                        "verses_span": "9-10",
+                        "verse_text_excerpt": "These are verses 9-10 of the root text.",
+                        "children": []
+                    }
+                ]
             }
         ]
-        
+    }
+]
+
+# Encoded once; decoding it is a much cheaper deep copy than copy.deepcopy
+DUMMY_OUTLINE_JSON = orjson.dumps(DUMMY_OUTLINE)
+
+# Expected output after processing
+EXPECTED_OUTPUT = [
+    {
+        "level": "chapter",
+        "number": "1",
+        "title": "Test Chapter",
+        "verses_span": "1-10",
+        "combined_verse_text_excerpt": "These are verses 1-3 of the root text.\n\nThese are verses 4-5 of the root text.\n\nThese are verses 6-8 of the root text.\n\nThese are verses 9-10 of the root text."
+    },
+    {
+        "level": "section",
+        "number": "1.1",
+        "title": "Test Section 1",
+        "verses_span": "1-5",
+        "combined_verse_text_excerpt": "These are verses 1-3 of the root text.\n\nThese are verses 4-5 of the root text."
+    },
+    {
+        "level": "section",
+        "number": "1.2",
+        "title": "Test Section 2",
+        "verses_span": "6-10",
+        "combined_verse_text_excerpt": "These are verses 6-8 of the root text.\n\nThese are verses 9-10 of the root text."
+    }
+]
+
+class TestOutlineParser(unittest.TestCase):
     def test_process_node_recursive(self):
         """Test the recursive node processing function with dummy data"""
-        # Make a deep copy of the dummy outline to avoid modifying the original
-        test_outline = copy.deepcopy(self.dummy_outline)
+        # Decode a fresh copy of the dummy outline to avoid modifying the original
+        test_outline = orjson.loads(DUMMY_OUTLINE_JSON)
         
         # Process the test chapter node
         result = process_node_recursive(test_outline[0])
@@ -125,8 +128,8 @@ class TestOutlineParser(unittest.TestCase):
     
     def test_process_outline_json(self):
         """Test the main processing function with dummy data"""
-        # Make a deep copy of the dummy outline to avoid modifying the original
-        test_outline = copy.deepcopy(self.dummy_outline)
+        # Decode a fresh copy of the dummy outline to avoid modifying the original
+        test_outline = orjson.loads(DUMMY_OUTLINE_JSON)
         
         # Process the test outline
         result = process_outline_json(test_outline)
@@ -157,35 +160,28 @@ class TestOutlineParser(unittest.TestCase):
         self.assertNotIn("These are verses 1-3 of the root text.", section2_text)
 
     def test_end_to_end(self):
-        """Test the full process with a temporary file"""
-        # Create a temporary directory for test data
-        test_dir = Path("./test_data")
-        test_dir.mkdir(exist_ok=True)
-        
-        # Write dummy outline to a temporary file
-        test_outline_file = test_dir / "test_outline.json"
-        with open(test_outline_file, "w", encoding='utf-8') as f:
-            json.dump(self.dummy_outline, f, indent=2, ensure_ascii=False)
-        
-        # Process the outline
-        outline_data_str = test_outline_file.read_text(encoding='utf-8')
-        outline_data = json.loads(outline_data_str)
+        """Test the full process, writing the output to a temporary file"""
+        # Create a private temporary directory so concurrent test runs cannot collide
+        test_dir = Path(tempfile.mkdtemp(prefix="outline_test_"))
+        self.addCleanup(shutil.rmtree, test_dir, ignore_errors=True)
+        
+        # Decode the input from the in-memory encoded outline; only the
+        # processed output goes through a real file
+        outline_data = orjson.loads(DUMMY_OUTLINE_JSON)
         processed_outline = process_outline_json(outline_data)
         
         # Write the processed output to a temporary file
         output_file = test_dir / "updated_outline.json"
-        with open(output_file, "w", encoding='utf-8') as f:
-            json.dump(processed_outline, f, indent=2, ensure_ascii=False)
+        output_file.write_bytes(orjson.dumps(processed_outline, option=orjson.OPT_INDENT_2))
         
         # Verify the output file exists
         self.assertTrue(output_file.exists())
         
         # Read the output file and verify its contents
-        with open(output_file, "r", encoding='utf-8') as f:
-            result = json.load(f)
+        result = orjson.loads(output_file.read_bytes())
         
         # Check that the result has the same structure as the original but with verse_text_excerpt added
-        self.assertEqual(len(result), len(self.dummy_outline))
+        self.assertEqual(len(result), len(DUMMY_OUTLINE))
         
         # Check that chapter has verse_text_excerpt
         chapter = result[0]
@@ -194,11 +190,6 @@ class TestOutlineParser(unittest.TestCase):
         # Check that all sections have verse_text_excerpt
         for section in chapter["children"]:
             self.assertIn("verse_text_excerpt", section)
-        
-        # Clean up test files
-        test_outline_file.unlink()
-        output_file.unlink()
-        test_dir.rmdir()
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+import orjson
+from remove_excerpts import remove_verse_excerpts, remove_verse_excerpts_text
+
+
+class TestRemoveVerseExcerptsText(unittest.TestCase):
+    def assertRemoved(self, document, expected):
+        """Check the filtered bytes are valid JSON equal to the expected value"""
+        result = remove_verse_excerpts_text(document)
+        self.assertNotIn(b'"verse_text_excerpt"', result)
+        self.assertEqual(orjson.loads(result), expected)
+        return result
+    
+    def test_member_positions(self):
+        """The member is removed with one adjacent comma wherever it appears"""
+        for document in [
+            b'{"verse_text_excerpt": "x", "level": "chapter", "number": "1"}',
+            b'{"level": "chapter", "verse_text_excerpt": "x", "number": "1"}',
+            b'{"level": "chapter", "number": "1", "verse_text_excerpt": "x"}',
+        ]:
+            with self.subTest(document=document):
+                self.assertRemoved(document, {"level": "chapter", "number": "1"})
+    
+    def test_indented_document_keeps_its_formatting(self):
+        """Only the member and its comma are removed from an indented document"""
+        document = (b'[\n  {\n    "level": "chapter",\n'
+                    b'    "verse_text_excerpt": "x",\n    "number": "1"\n  }\n]')
+        result = self.assertRemoved(document, [{"level": "chapter", "number": "1"}])
+        self.assertEqual(result, b'[\n  {\n    "level": "chapter",\n    "number": "1"\n  }\n]')
+    
+    def test_escaped_quotes_and_backslashes_in_values(self):
+        """Escapes inside the excerpt and in neighbouring values do not end the match early"""
+        document = (b'{"title": "a \\"quoted\\" title \\\\", '
+                    b'"verse_text_excerpt": "say \\"hi\\", \\\\ \\\\\\" done", '
+                    b'"number": "\\\\"}')
+        self.assertRemoved(document, {"title": 'a "quoted" title \\', "number": "\\"})
+    
+    def test_key_text_inside_a_string_is_left_alone(self):
+        """An escaped mention of the key inside another value is not a member"""
+        document = b'{"title": "see \\"verse_text_excerpt\\": \\"x\\"", "number": "1"}'
+        self.assertEqual(remove_verse_excerpts_text(document), document)
+    
+    def test_nested_objects_are_filtered_too(self):
+        """Members are removed from every object, not only outline nodes"""
+        document = b'{"number": "1", "summary": {"verse_text_excerpt": "x", "content": "y"}}'
+        self.assertRemoved(document, {"number": "1", "summary": {"content": "y"}})
+    
+    def test_members_the_text_filter_leaves_in_place(self):
+        """The only key in an object and non-string values are not removed textually"""
+        for document in [
+            b'{"verse_text_excerpt": "x"}',
+            b'{"number": "1", "verse_text_excerpt": null}',
+            b'{"number": "1", "verse_text_excerpt": ["x", "y"]}',
+        ]:
+            with self.subTest(document=document):
+                self.assertEqual(remove_verse_excerpts_text(document), document)
+
+
+class TestRemoveVerseExcerpts(unittest.TestCase):
+    def test_falls_back_to_parsing_for_remaining_members(self):
+        """Members left by the text filter are removed by the parsed fallback"""
+        for document, expected in [
+            (b'[{"verse_text_excerpt": "x"}]', [{}]),
+            (b'[{"number": "1", "verse_text_excerpt": null}]', [{"number": "1"}]),
+            (b'[{"number": "1", "verse_text_excerpt": 3, '
+             b'"children": [{"number": "1.1", "verse_text_excerpt": "x"}]}]',
+             [{"number": "1", "children": [{"number": "1.1"}]}]),
+        ]:
+            with self.subTest(document=document):
+                self.assertEqual(orjson.loads(remove_verse_excerpts(document)), expected)
+    
+    def test_text_filter_result_is_kept_when_nothing_remains(self):
+        """Documents fully handled by the text filter keep their formatting"""
+        document = b'[{"number": "1",   "verse_text_excerpt": "x"}]'
+        self.assertEqual(remove_verse_excerpts(document), b'[{"number": "1"}]')
+    
+    def test_malformed_document_is_not_cleaned(self):
+        """Truncated input raises instead of returning filtered bytes"""
+        document = b'[{"number": "1", "verse_text_excerpt": "x", "children": ['
+        with self.assertRaises(orjson.JSONDecodeError):
+            remove_verse_excerpts(document)
+    
+    def test_key_text_after_escaped_quote_is_kept(self):
+        """Key text inside another key never yields invalid JSON"""
+        document = b'{"k\\"verse_text_excerpt": "v", "n": 1}'
+        self.assertEqual(orjson.loads(remove_verse_excerpts(document)),
+                         {'k"verse_text_excerpt': "v", "n": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import io
+import unittest
+from run_structured_analysis import NODES_ADAPTER, write_nodes_json
+
+
+def make_summary(text):
+    """Build a Summary payload with every field derived from text"""
+    return {
+        "content_summary": text,
+        "key_concepts": [text, "བྱང་ཆུབ་སེམས།"],
+        "transformative_goal": text,
+        "function_in_hierarchy": text,
+        "inter_node_relationships": [
+            {"related_node_id": "1.2", "relationship_type": text, "conceptual_bridge": text}
+        ],
+        "implicit_concepts": [],
+        "pedagogical_strategy": text,
+        "intended_impact_on_reader": text,
+        "audience_assumptions": text,
+    }
+
+
+NODES = NODES_ADAPTER.validate_python([
+    {
+        "level": "chapter",
+        "number": "1",
+        "title": "First chapter",
+        "verses_span": "1-10",
+        "summary": make_summary("multi-line\n  summary"),
+        "children": [
+            {"level": "section", "number": "1.1", "title": "བདེ་གཤེགས་", "summary": make_summary("")}
+        ],
+    },
+    {"level": "chapter", "number": "2", "title": "Second chapter", "summary": make_summary("")},
+])
+
+
+class TestWriteNodesJson(unittest.TestCase):
+    def test_matches_adapter_dump(self):
+        """Nodes encoded one at a time give the same bytes as the list adapter"""
+        for nodes in ([], NODES):
+            with self.subTest(nodes=len(nodes)):
+                buffer = io.BytesIO()
+                write_nodes_json(nodes, buffer)
+                self.assertEqual(buffer.getvalue(), NODES_ADAPTER.dump_json(nodes, indent=2))
+                self.assertEqual(NODES_ADAPTER.validate_json(buffer.getvalue()), nodes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import contextlib
+import io
+import unittest
+from update_outline_with_segments import make_extractor
+
+ROOT_LINES = ["line one", "line two", "line three"]
+
+
+def extract_quietly(extract, segments_span):
+    """Run an extractor, returning its result and anything it printed."""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        segment_text = extract(segments_span)
+    return segment_text, output.getvalue()
+
+
+class TestMakeExtractor(unittest.TestCase):
+    def test_matches_slice_and_join(self):
+        """Extracted text equals joining the covered lines, for any valid span"""
+        extract = make_extractor(ROOT_LINES)
+        for segments_span, start, end in [
+            ("1-1", 1, 1),   # first line alone
+            ("3-3", 3, 3),   # last line alone
+            ("2-2", 2, 2),   # single middle line
+            ("1-2", 1, 2),   # starts at the first line
+            ("2-3", 2, 3),   # ends at the last line
+            ("1-3", 1, 3),   # whole text
+        ]:
+            with self.subTest(segments_span=segments_span):
+                self.assertEqual(extract(segments_span), "\n".join(ROOT_LINES[start - 1:end]))
+    
+    def test_empty_lines_are_kept(self):
+        """Blank lines inside a span are kept, including at either end"""
+        root_lines = ["", "middle", ""]
+        extract = make_extractor(root_lines)
+        self.assertEqual(extract("1-3"), "\nmiddle\n")
+        self.assertEqual(extract("1-1"), "")
+        self.assertEqual(extract("3-3"), "")
+    
+    def test_whitespace_around_span_numbers_is_accepted(self):
+        """Spans padded with whitespace parse as they did with int()"""
+        extract = make_extractor(ROOT_LINES)
+        for segments_span in (" 1-2", "1-2 ", "1 - 2", "\t1 -2\n"):
+            with self.subTest(segments_span=segments_span):
+                self.assertEqual(extract_quietly(extract, segments_span), ("line one\nline two", ""))
+    
+    def test_out_of_range_spans_warn_and_return_empty_text(self):
+        """Spans outside the text or running backwards give a warning and no text"""
+        extract = make_extractor(ROOT_LINES)
+        for segments_span in ("0-1", "3-4", "4-4", "3-2"):
+            with self.subTest(segments_span=segments_span):
+                segment_text, printed = extract_quietly(extract, segments_span)
+                self.assertEqual(segment_text, "")
+                self.assertIn("Invalid span", printed)
+    
+    def test_non_string_spans_warn_and_return_empty_text(self):
+        """Malformed spans of any type give a warning, never an exception"""
+        extract = make_extractor(ROOT_LINES)
+        for segments_span in (["1-2"], {"start": 1}, 12):
+            with self.subTest(segments_span=segments_span):
+                segment_text, printed = extract_quietly(extract, segments_span)
+                self.assertEqual(segment_text, "")
+                self.assertIn("Warning", printed)
+    
+    def test_repeated_span_is_cached(self):
+        """A repeated string span is served from the cache without re-warning"""
+        extract = make_extractor(ROOT_LINES)
+        self.assertEqual(extract_quietly(extract, "1-2"), ("line one\nline two", ""))
+        self.assertEqual(extract_quietly(extract, "1-2"), ("line one\nline two", ""))
+        
+        _, printed = extract_quietly(extract, "3-1")
+        self.assertIn("Warning", printed)
+        self.assertEqual(extract_quietly(extract, "3-1"), ("", ""))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,18 +5,25 @@ Script to update outline JSON file with segment text from root text file.
 Usage: python update_outline_with_segments.py
 """
 
-import json
+import itertools
+import re
 import sys
+import orjson
 from pathlib import Path
 
+# A segments span such as "1-12" or "4-4", allowing whitespace around either number
+SPAN_RE = re.compile(r'\s*(\d+)\s*-\s*(\d+)\s*')
+
 
 def read_root_text(file_path):
     """Read the root text file and return list of lines."""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-        # Remove trailing newlines but preserve the text
-        return [line.rstrip('\n') for line in lines]
+        # Split the whole text once; split('\n') rather than splitlines() so only
+        # newlines break lines, exactly as readlines() does
+        lines = Path(file_path).read_text(encoding='utf-8').split('\n')
+        if lines[-1] == '':
+            lines.pop()
+        return lines
     except FileNotFoundError:
         print(f"Error: Root text file '{file_path}' not found.")
         sys.exit(1)
@@ -25,66 +32,107 @@ def read_root_text(file_path):
         sys.exit(1)
 
 
-def extract_segment_text(root_lines, segments_span):
+def parse_segments_span(segments_span, line_count):
     """
-    Extract text from root_lines based on segments_span.
+    Parse segments_span into 0-based inclusive line indices.
     
     Args:
-        root_lines: List of text lines from root file
         segments_span: String like "1-12" or "4-4"
+        line_count: Number of lines in the root text
     
     Returns:
-        String containing the extracted segment text
+        Tuple (start_idx, end_idx), or None if the span is malformed or out of range
     """
-    if not segments_span:
-        return ""
+    # Parse the span (e.g., "1-12" -> start=1, end=12)
+    match = SPAN_RE.fullmatch(segments_span) if isinstance(segments_span, str) else None
+    if match is None:
+        print(f"Warning: Could not parse segments_span '{segments_span}'")
+        return None
     
-    try:
-        # Parse the span (e.g., "1-12" -> start=1, end=12)
-        start_str, end_str = segments_span.split('-')
-        start = int(start_str)
-        end = int(end_str)
-        
-        # Convert to 0-based indexing for Python lists
-        start_idx = start - 1
-        end_idx = end - 1
-        
-        # Validate indices
-        if start_idx < 0 or end_idx >= len(root_lines) or start_idx > end_idx:
-            print(f"Warning: Invalid span '{segments_span}' for text with {len(root_lines)} lines")
+    # Convert to 0-based indexing for Python lists
+    start_idx = int(match.group(1)) - 1
+    end_idx = int(match.group(2)) - 1
+    
+    # Validate indices
+    if start_idx < 0 or end_idx >= line_count or start_idx > end_idx:
+        print(f"Warning: Invalid span '{segments_span}' for text with {line_count} lines")
+        return None
+    
+    return start_idx, end_idx
+
+
+def make_extractor(root_lines):
+    """
+    Build a segment text extractor bound to the given root lines.
+    
+    The lines are joined into one string once, with a table of line start
+    offsets, so each span is extracted with a single slice instead of a
+    list slice and join. The returned closure also caches each distinct
+    string span, so callers pass only the span.
+    
+    Args:
+        root_lines: List of text lines from root file
+    
+    Returns:
+        Function mapping a segments_span to its segment text
+    """
+    text = '\n'.join(root_lines)
+    line_count = len(root_lines)
+    # line_starts[i] is the offset of line i; the final entry sits one newline
+    # past the end of the text, so line i always ends at line_starts[i + 1] - 1
+    line_starts = [0, *itertools.accumulate(len(line) + 1 for line in root_lines)]
+    span_cache = {}
+    
+    def extract(segments_span):
+        if not segments_span:
             return ""
         
-        # Extract the text
-        segment_lines = root_lines[start_idx:end_idx + 1]
-        return '\n'.join(segment_lines)
+        # Only string spans are cached; anything else (e.g. a list in a
+        # hand-edited outline) may be unhashable and is just warned about
+        cacheable = isinstance(segments_span, str)
+        if cacheable:
+            try:
+                return span_cache[segments_span]
+            except KeyError:
+                pass
         
-    except ValueError as e:
-        print(f"Warning: Could not parse segments_span '{segments_span}': {e}")
-        return ""
-    except Exception as e:
-        print(f"Warning: Error extracting segment '{segments_span}': {e}")
-        return ""
+        indices = parse_segments_span(segments_span, line_count)
+        if indices is None:
+            segment_text = ""
+        else:
+            start_idx, end_idx = indices
+            segment_text = text[line_starts[start_idx]:line_starts[end_idx + 1] - 1]
+        if cacheable:
+            span_cache[segments_span] = segment_text
+        return segment_text
+    
+    return extract
 
 
-def update_node_with_segment_text(node, root_lines):
+def update_node_with_segment_text(node, extract):
     """
-    Recursively update a node and its children with segment_text field.
+    Update a node and all of its descendants with a segment_text field.
+    
+    Nodes are visited in pre-order with an explicit stack rather than by
+    recursion, so deep outlines cannot hit the recursion limit.
     
     Args:
         node: Dictionary representing a node in the outline
-        root_lines: List of text lines from root file
+        extract: Extractor from make_extractor for the root text
     """
-    # Add segment_text field to current node
-    if 'segments_span' in node:
-        segment_text = extract_segment_text(root_lines, node['segments_span'])
-        node['segment_text'] = segment_text
-    else:
-        node['segment_text'] = ""
-    
-    # Recursively process children
-    if 'children' in node:
-        for child in node['children']:
-            update_node_with_segment_text(child, root_lines)
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        
+        # Add segment_text field to current node
+        if 'segments_span' in current:
+            current['segment_text'] = extract(current['segments_span'])
+        else:
+            current['segment_text'] = ""
+        
+        # Push children in reverse so they are processed in document order
+        if 'children' in current:
+            stack.extend(reversed(current['children']))
 
 
 def update_outline_with_segments(outline_path, root_text_path):
@@ -96,42 +144,38 @@ def update_outline_with_segments(outline_path, root_text_path):
         root_text_path: Path to the root text file
     """
     # Read the root text file
-    print(f"Reading root text from: {root_text_path}")
     root_lines = read_root_text(root_text_path)
-    print(f"Loaded {len(root_lines)} lines from root text file")
     
     # Read the outline JSON file
-    print(f"Reading outline from: {outline_path}")
     try:
-        with open(outline_path, 'r', encoding='utf-8') as f:
-            outline_data = json.load(f)
+        with open(outline_path, 'rb') as f:
+            outline_data = orjson.loads(f.read())
     except FileNotFoundError:
         print(f"Error: Outline file '{outline_path}' not found.")
         sys.exit(1)
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         print(f"Error: Invalid JSON in outline file: {e}")
         sys.exit(1)
     except Exception as e:
         print(f"Error reading outline file: {e}")
         sys.exit(1)
     
-    print(f"Loaded outline with {len(outline_data)} top-level nodes")
-    
     # Update each top-level node
-    print("Updating nodes with segment text...")
+    extract = make_extractor(root_lines)
     for node in outline_data:
-        update_node_with_segment_text(node, root_lines)
+        update_node_with_segment_text(node, extract)
     
     # Write the updated outline back to the file
-    print(f"Writing updated outline to: {outline_path}")
     try:
-        with open(outline_path, 'w', encoding='utf-8') as f:
-            json.dump(outline_data, f, ensure_ascii=False, indent=2)
+        with open(outline_path, 'wb') as f:
+            f.write(orjson.dumps(outline_data, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE))
     except Exception as e:
         print(f"Error writing updated outline file: {e}")
         sys.exit(1)
     
-    print("✓ Successfully updated outline with segment text!")
+    # Report once at the end; errors and span warnings are still printed as they occur
+    print(f"✓ Updated {outline_path} with segment text from {root_text_path} "
+          f"({len(root_lines)} lines, {len(outline_data)} top-level nodes)")
 
 
 def main():
@@ -140,16 +184,7 @@ def main():
     outline_path = Path("./data/diamond_sutra/outline_bo.json")
     root_text_path = Path("./data/diamond_sutra/root_bo.txt")
     
-    # Check if files exist
-    if not outline_path.exists():
-        print(f"Error: Outline file '{outline_path}' does not exist.")
-        sys.exit(1)
-    
-    if not root_text_path.exists():
-        print(f"Error: Root text file '{root_text_path}' does not exist.")
-        sys.exit(1)
-    
-    # Update the outline
+    # Update the outline; missing files are reported when they are opened
     update_outline_with_segments(outline_path, root_text_path)
 
 